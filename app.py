@@ -1,22 +1,34 @@
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from heapq import heappop, heappush
 from pathlib import Path
 from typing import Dict, List
 
+import igraph as ig
 import joblib
 import networkx as nx
 import numpy as np
+import orjson
 import pandas as pd
-from flask import Flask, jsonify, request
+from flask import Flask, Response, request
 from flask_cors import CORS
-from networkx.algorithms.shortest_paths.astar import astar_path
-from networkx.algorithms.simple_paths import shortest_simple_paths
+from numba import njit
 from waitress import serve
 
+try:
+    import tl2cgen
+except ImportError:  # optional; forecasts fall back to sklearn predict
+    tl2cgen = None
+
 DATA_DIR = Path("data")
 MODELS_DIR = Path("models")
 NODES_CSV = DATA_DIR / "nodes.csv"
 EDGES_CSV = DATA_DIR / "edges.csv"
 MODEL_PATH = MODELS_DIR / "rf_flow.pkl"
 LINEAR_MODEL_PATH = MODELS_DIR / "linear_flow.pkl"
+LIB_SUFFIX = {"win32": ".dll", "darwin": ".dylib"}.get(sys.platform, ".so")
+COMPILED_MODEL_PATH = MODELS_DIR / f"rf_flow{LIB_SUFFIX}"
 
 FEATURES = [
     "hour",
@@ -60,6 +72,18 @@ def load_model():
     return joblib.load(MODEL_PATH)
 
 
+def load_compiled_model():
+    """
+    tl2cgen predictor for the compiled flow model, or None if it's missing,
+    older than rf_flow.pkl, or tl2cgen isn't installed.
+    """
+    if tl2cgen is None or not COMPILED_MODEL_PATH.exists():
+        return None
+    if COMPILED_MODEL_PATH.stat().st_mtime < MODEL_PATH.stat().st_mtime:
+        return None
+    return tl2cgen.Predictor(str(COMPILED_MODEL_PATH), nthread=1)
+
+
 def ensure_linear_model():
     """Train the baseline linear model if it's missing."""
     MODELS_DIR.mkdir(exist_ok=True)
@@ -82,7 +106,7 @@ def ensure_linear_model():
 
 def ensure_model():
     """
-    Train the RandomForest model at runtime if it's missing, otherwise load it.
+    Train the flow model at runtime if it's missing, otherwise load it.
     Also ensures the baseline linear model exists. Falls back to generating
     synthetic flow splits if training data is absent.
     """
@@ -111,9 +135,84 @@ def ensure_model():
     return load_model()
 
 
+def edge_arrays(G: nx.Graph):
+    """
+    Column-wise (SoA) view of the graph edges, in GRAPH.edges() order, so the
+    forecast and routing hot paths index flat arrays instead of edge dicts.
+    """
+    ids, us, vs, lengths, caps = [], [], [], [], []
+    for u, v, data in G.edges(data=True):
+        ids.append(data["id"])
+        us.append(u)
+        vs.append(v)
+        lengths.append(data.get("length_m", 100))
+        caps.append(data.get("capacity", 400))
+    return (
+        np.array(ids, dtype=object),
+        np.array(us, dtype=object),
+        np.array(vs, dtype=object),
+        # float64 so routing weights sum exactly like the per-edge attrs
+        np.asarray(lengths, dtype=np.float64),
+        np.asarray(caps, dtype=np.float32),
+    )
+
+
+def csr_arrays(G: nx.Graph, edge_index: Dict[str, int]):
+    """
+    CSR adjacency for the jitted A*: node i's neighbours are
+    indices[indptr[i]:indptr[i + 1]] (in G._adj order), and csr_edge maps each
+    slot to its row in the EDGE_* arrays so weights can be gathered per slot.
+    """
+    node_ids = list(G._adj)
+    node_index = {n: i for i, n in enumerate(node_ids)}
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+    indices, csr_edge = [], []
+    for i, n in enumerate(node_ids):
+        for nbr, data in G._adj[n].items():
+            indices.append(node_index[nbr])
+            csr_edge.append(edge_index[data["id"]])
+        indptr[i + 1] = len(indices)
+    return (
+        node_ids,
+        node_index,
+        indptr,
+        np.asarray(indices, dtype=np.int32),
+        np.asarray(csr_edge, dtype=np.int32),
+    )
+
+
 GRAPH = load_graph()
+EDGE_IDS, EDGE_U, EDGE_V, EDGE_LEN, EDGE_CAP = edge_arrays(GRAPH)
+EDGE_ID_TO_INDEX: Dict[str, int] = {eid: i for i, eid in enumerate(EDGE_IDS)}
+# Pre-boxed Python copies for building /forecast records; capacity comes
+# from the edge attrs so it keeps its original (int) values
+EDGE_ID_LIST: List[str] = EDGE_IDS.tolist()
+EDGE_CAP_LIST: List = [d.get("capacity", 400) for _, _, d in GRAPH.edges(data=True)]
+NODE_IDS, NODE_INDEX, CSR_INDPTR, CSR_INDICES, CSR_EDGE = csr_arrays(
+    GRAPH, EDGE_ID_TO_INDEX
+)
+CSR_LEN = EDGE_LEN[CSR_EDGE]
+# igraph mirror of GRAPH: vertex i is NODE_IDS[i], edge i is EDGE_IDS[i]
+IGRAPH = ig.Graph(
+    n=len(NODE_IDS),
+    edges=[(NODE_INDEX[u], NODE_INDEX[v]) for u, v in zip(EDGE_U, EDGE_V)],
+)
+IGRAPH_LEN = EDGE_LEN.tolist()
+# Per-node coords entry for /route responses, built once and shared
+NODE_META: Dict[str, Dict] = {
+    n: {"id": n, **data} for n, data in GRAPH.nodes(data=True)
+}
 MODEL = ensure_model()
-FORECAST_CACHE: Dict[tuple, List[Dict]] = {}
+COMPILED_MODEL = load_compiled_model()
+FORECAST_CACHE: Dict[tuple, "Forecast"] = {}
+
+
+def json_response(obj) -> Response:
+    """orjson-encoded JSON response (drop-in for jsonify)."""
+    return Response(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+        mimetype="application/json",
+    )
 
 
 def travel_time_minutes(length_m: float, speed_mps: float = 1.3) -> float:
@@ -121,67 +220,135 @@ def travel_time_minutes(length_m: float, speed_mps: float = 1.3) -> float:
     return length_m / speed_mps / 60.0
 
 
-def predict_forecast(hour: float, day_of_week: int, is_peak: int) -> List[Dict]:
-    rows = []
-    for u, v, data in GRAPH.edges(data=True):
-        cap = data.get("capacity", 400)
-        length_m = data.get("length_m", 100)
-        # Default lag placeholders; real lag would come from time-series
-        flow_lag1 = 0.1 * cap
-        flow_lag2 = 0.1 * cap
-        rows.append(
-            {
-                "edge_id": data["id"],
-                "hour": hour,
-                "day_of_week": day_of_week,
-                "is_peak": is_peak,
-                "capacity": cap,
-                "length_m": length_m,
-                "flow_lag1": flow_lag1,
-                "flow_lag2": flow_lag2,
-            }
-        )
-    df = pd.DataFrame(rows)
-    X = df[FEATURES]
-    preds = MODEL.predict(X)
-    df["pred_flow"] = preds
-    out = df[["edge_id", "pred_flow", "capacity"]].to_dict(orient="records")
-    return out
+def feature_template() -> np.ndarray:
+    """
+    (n_edges, FEATURES) matrix with the per-edge columns filled in; only
+    hour/day_of_week/is_peak change between forecasts. float64 because the
+    HistGradientBoosting split thresholds can sit exactly on training values
+    (e.g. length 70.3), and float32 rounding would flip those splits.
+    """
+    X = np.zeros((len(EDGE_IDS), len(FEATURES)), dtype=np.float64)
+    X[:, 3] = EDGE_CAP
+    X[:, 4] = EDGE_LEN
+    # Default lag placeholders; real lag would come from time-series
+    X[:, 5] = 0.1 * X[:, 3]
+    X[:, 6] = 0.1 * X[:, 3]
+    return X
+
+
+FEATURE_TEMPLATE = feature_template()
+
+
+def predict_forecast(hour: float, day_of_week: int, is_peak: int) -> np.ndarray:
+    """Predicted flow per edge, aligned with EDGE_IDS."""
+    X = FEATURE_TEMPLATE.copy()
+    X[:, 0] = hour
+    X[:, 1] = day_of_week
+    X[:, 2] = is_peak
+    if COMPILED_MODEL is not None:
+        preds = COMPILED_MODEL.predict(tl2cgen.DMatrix(X, dtype="float64")).ravel()
+    else:
+        preds = MODEL.predict(X)
+    return preds
+
+
+def congestion_penalties(pred_flow: np.ndarray) -> np.ndarray:
+    """Per-edge penalty tier (0 / 0.3 / 0.7) from the predicted load ratio."""
+    ratio = pred_flow / np.maximum(EDGE_CAP, 1)
+    return np.where(ratio < 0.5, 0.0, np.where(ratio < 0.8, 0.3, 0.7))
+
 
+@dataclass(frozen=True)
+class Forecast:
+    """
+    One immutable forecast. /forecast swaps app.forecast to a new instance
+    rather than mutating it, so a /route already in flight keeps a
+    consistent set of weights. Hashes on key alone, so it can be passed
+    straight into the lru_cache'd route helpers.
+    """
 
-def congestion_penalty(edge_id: str) -> float:
-    forecast_map = getattr(app, "forecast_map", {})
-    f = forecast_map.get(edge_id)
-    if not f:
-        return 0.0
-    ratio = f["pred_flow"] / max(f["capacity"], 1)
-    if ratio < 0.5:
-        return 0.0
-    if ratio < 0.8:
-        return 0.3
-    return 0.7
+    key: tuple
+    preds: np.ndarray = field(compare=False)
+    pen_weight: List[float] = field(compare=False)  # aligned with EDGE_IDS
+    pen_weight_csr: np.ndarray = field(compare=False)  # aligned with CSR slots
 
 
-def astar_with_congestion(source: str, target: str) -> List[str]:
-    def heuristic(u, v):
-        return 0
+def build_forecast(key: tuple) -> Forecast:
+    preds = predict_forecast(*key)
+    # Congestion-penalized weight per edge, aligned with EDGE_IDS
+    penalty = congestion_penalties(preds)
+    pen_weight = (EDGE_LEN * (1 + penalty)).tolist()
+    return Forecast(key, preds, pen_weight, np.asarray(pen_weight)[CSR_EDGE])
 
-    def cost(u, v, data):
-        base = data.get("length_m", 1.0)
-        pen = congestion_penalty(data.get("id"))
-        return base * (1 + pen)
 
-    return astar_path(GRAPH, source, target, heuristic=heuristic, weight=cost)
+@njit(cache=True, nogil=True)
+def astar_csr(indptr, indices, weights, source, target):
+    """
+    A* (zero heuristic) over a CSR graph; mirrors networkx.astar_path's queue
+    and tie-breaking. Returns node indices source..target, empty if unreachable.
+    """
+    n = indptr.shape[0] - 1
+    enqueued = np.full(n, np.inf)
+    # parent on best path; -2 = not explored, -1 = source
+    explored = np.full(n, -2, dtype=np.int64)
+    c = 0
+    queue = [(0.0, c, source, 0.0, -1)]
+
+    while queue:
+        _, __, curnode, dist, parent = heappop(queue)
+
+        if curnode == target:
+            path = [curnode]
+            node = parent
+            while node != -1:
+                path.append(node)
+                node = explored[node]
+            return np.array(path[::-1], dtype=np.int64)
+
+        if explored[curnode] != -2:
+            # Do not override the parent of starting node
+            if explored[curnode] == -1:
+                continue
+            # Skip bad paths that were enqueued before finding a better one
+            if enqueued[curnode] < dist:
+                continue
+
+        explored[curnode] = parent
+
+        for j in range(indptr[curnode], indptr[curnode + 1]):
+            neighbor = indices[j]
+            ncost = dist + weights[j]
+            if enqueued[neighbor] <= ncost:
+                continue
+            enqueued[neighbor] = ncost
+            c += 1
+            heappush(queue, (ncost, c, np.int64(neighbor), ncost, curnode))
+
+    return np.empty(0, dtype=np.int64)
+
+
+def astar_indices(source: str, target: str, weights: np.ndarray) -> List[str]:
+    """Run astar_csr on node ids with per-CSR-slot weights."""
+    path = astar_csr(
+        CSR_INDPTR, CSR_INDICES, weights, NODE_INDEX[source], NODE_INDEX[target]
+    )
+    if not len(path):
+        raise nx.NetworkXNoPath(f"Node {target} not reachable from {source}")
+    return [NODE_IDS[i] for i in path.tolist()]
+
+
+def astar_with_congestion(
+    source: str, target: str, pen_weight_csr: np.ndarray
+) -> List[str]:
+    return astar_indices(source, target, pen_weight_csr)
 
 
 def astar_distance_only(source: str, target: str) -> List[str]:
-    def heuristic(u, v):
-        return 0
+    return astar_indices(source, target, CSR_LEN)
 
-    def cost(u, v, data):
-        return data.get("length_m", 1.0)
 
-    return astar_path(GRAPH, source, target, heuristic=heuristic, weight=cost)
+def path_coords(path: List[str]) -> List[Dict]:
+    return [NODE_META[n] for n in path]
 
 
 def path_length(path: List[str]) -> float:
@@ -192,30 +359,38 @@ def path_length(path: List[str]) -> float:
     return total
 
 
-def build_penalized_graph() -> nx.Graph:
-    """Create a copy of the graph with congestion-penalized weights."""
-    Gp = GRAPH.copy()
-    for u, v, data in Gp.edges(data=True):
-        pen = congestion_penalty(data.get("id"))
-        base = float(data.get("length_m", 1.0))
-        data["pen_weight"] = base * (1 + pen)
-    return Gp
-
-
 def k_shortest_paths(
-    G: nx.Graph, source: str, target: str, weight: str, k: int = 3
+    source: str, target: str, weights, k: int = 3
 ) -> List[List[str]]:
-    """Return up to k shortest simple paths by given weight."""
-    paths = []
-    for path in shortest_simple_paths(G, source, target, weight=weight):
-        paths.append(path)
-        if len(paths) >= k:
-            break
-    return paths
+    """
+    Return up to k shortest simple paths (Yen, in igraph's C core) given
+    per-edge weights aligned with EDGE_IDS. k < 1 still yields the best
+    path, as the shortest_simple_paths loop this replaced did.
+    """
+    paths = IGRAPH.get_k_shortest_paths(
+        NODE_INDEX[source], NODE_INDEX[target], k=max(1, k), weights=weights
+    )
+    if not paths:
+        raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+    return [[NODE_IDS[i] for i in p] for p in paths]
 
 
-@app.route("/graph")
-def get_graph():
+@lru_cache(maxsize=1024)
+def penalized_routes(source: str, target: str, k: int, forecast: Forecast):
+    """Congestion-aware best path + k alternatives for one forecast."""
+    best = astar_with_congestion(source, target, forecast.pen_weight_csr)
+    return best, k_shortest_paths(source, target, forecast.pen_weight, k)
+
+
+@lru_cache(maxsize=1024)
+def distance_routes(source: str, target: str, k: int):
+    """Shortest path + k alternatives by distance (forecast-independent)."""
+    shortest = astar_distance_only(source, target)
+    return shortest, k_shortest_paths(source, target, IGRAPH_LEN, k)
+
+
+def graph_payload() -> Dict:
+    """Nodes and edges of GRAPH as served by /graph."""
     nodes = []
     for node_id, data in GRAPH.nodes(data=True):
         nodes.append(
@@ -238,7 +413,16 @@ def get_graph():
                 "kind": data.get("kind"),
             }
         )
-    return jsonify({"nodes": nodes, "edges": edges})
+    return {"nodes": nodes, "edges": edges}
+
+
+# GRAPH never changes after load, so /graph is serialized once
+GRAPH_JSON_BYTES = orjson.dumps(graph_payload())
+
+
+@app.route("/graph")
+def get_graph():
+    return Response(GRAPH_JSON_BYTES, mimetype="application/json")
 
 
 @app.route("/forecast", methods=["GET"])
@@ -248,17 +432,24 @@ def forecast():
         day_of_week = int(request.args.get("day_of_week", 1))
         is_peak = int(request.args.get("is_peak", 1))
     except (TypeError, ValueError):
-        return jsonify({"error": "invalid hour/day_of_week/is_peak"}), 400
+        return json_response({"error": "invalid hour/day_of_week/is_peak"}), 400
 
     key = (hour, day_of_week, is_peak)
     use_cache = request.args.get("use_cache", "true").lower() != "false"
     if use_cache and key in FORECAST_CACHE:
-        result = FORECAST_CACHE[key]
+        snapshot = FORECAST_CACHE[key]
     else:
-        result = predict_forecast(hour, day_of_week, is_peak)
-        FORECAST_CACHE[key] = result
-    app.forecast_map = {r["edge_id"]: r for r in result}
-    return jsonify(result)
+        snapshot = build_forecast(key)
+        FORECAST_CACHE[key] = snapshot
+    # Single assignment: /route sees either the old forecast or this one
+    app.forecast = snapshot
+    pred_list = snapshot.preds.tolist()
+    return json_response(
+        [
+            {"edge_id": eid, "pred_flow": pred, "capacity": cap}
+            for eid, pred, cap in zip(EDGE_ID_LIST, pred_list, EDGE_CAP_LIST)
+        ]
+    )
 
 
 @app.route("/route", methods=["GET"])
@@ -266,86 +457,58 @@ def route():
     source = request.args.get("source")
     target = request.args.get("target")
     mode = request.args.get("mode", "both")
-    k = int(request.args.get("k", 3))
+    try:
+        k = max(1, int(request.args.get("k", 3)))
+    except (TypeError, ValueError):
+        return json_response({"error": "invalid k"}), 400
     if not source or not target:
-        return jsonify({"error": "source and target are required"}), 400
+        return json_response({"error": "source and target are required"}), 400
     if source not in GRAPH or target not in GRAPH:
-        return jsonify({"error": "invalid source/target"}), 400
-    if not getattr(app, "forecast_map", None):
-        return jsonify({"error": "forecast not loaded; call /forecast first"}), 400
+        return json_response({"error": "invalid source/target"}), 400
+    forecast = getattr(app, "forecast", None)
+    if forecast is None:
+        return (
+            json_response({"error": "forecast not loaded; call /forecast first"}),
+            400,
+        )
     out = {}
     try:
         if mode in ("both", "penalized"):
             # Primary congestion-aware path
-            best = astar_with_congestion(source, target)
-            Gp = build_penalized_graph()
-            alt_paths = k_shortest_paths(Gp, source, target, "pen_weight", k)
+            best, alt_paths = penalized_routes(source, target, k, forecast)
             out["best"] = {
                 "path": best,
                 "len_m": path_length(best),
-                "coords": [
-                    {
-                        "id": n,
-                        "lat": GRAPH.nodes[n]["lat"],
-                        "lon": GRAPH.nodes[n]["lon"],
-                        "label": GRAPH.nodes[n]["label"],
-                    }
-                    for n in best
-                ],
+                "coords": path_coords(best),
             }
             out["best_alts"] = [
                 {
                     "path": p,
                     "len_m": path_length(p),
-                    "coords": [
-                        {
-                            "id": n,
-                            "lat": GRAPH.nodes[n]["lat"],
-                            "lon": GRAPH.nodes[n]["lon"],
-                            "label": GRAPH.nodes[n]["label"],
-                        }
-                        for n in p
-                    ],
+                    "coords": path_coords(p),
                 }
                 for p in alt_paths
             ]
         if mode in ("both", "distance"):
-            shortest = astar_distance_only(source, target)
-            alt_d = k_shortest_paths(GRAPH, source, target, "weight", k)
+            shortest, alt_d = distance_routes(source, target, k)
             out["shortest"] = {
                 "path": shortest,
                 "len_m": path_length(shortest),
-                "coords": [
-                    {
-                        "id": n,
-                        "lat": GRAPH.nodes[n]["lat"],
-                        "lon": GRAPH.nodes[n]["lon"],
-                        "label": GRAPH.nodes[n]["label"],
-                    }
-                    for n in shortest
-                ],
+                "coords": path_coords(shortest),
             }
             out["shortest_alts"] = [
                 {
                     "path": p,
                     "len_m": path_length(p),
-                    "coords": [
-                        {
-                            "id": n,
-                            "lat": GRAPH.nodes[n]["lat"],
-                            "lon": GRAPH.nodes[n]["lon"],
-                            "label": GRAPH.nodes[n]["label"],
-                        }
-                        for n in p
-                    ],
+                    "coords": path_coords(p),
                 }
                 for p in alt_d
             ]
     except nx.NetworkXNoPath:
-        return jsonify({"error": "no path"}), 404
+        return json_response({"error": "no path"}), 404
     if not out:
-        return jsonify({"error": "no path"}), 404
-    return jsonify(out)
+        return json_response({"error": "no path"}), 404
+    return json_response(out)
 
 
 if __name__ == "__main__":
@@ -5,9 +5,12 @@ and connecting each to its nearest existing node within a radius.
 
 import csv
 import json
-import math
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
 DATA_DIR = Path("data")
 NODES_CSV = DATA_DIR / "nodes.csv"
 EDGES_CSV = DATA_DIR / "edges.csv"
@@ -17,11 +20,19 @@ R = 6371000  # Earth radius meters
 
 
 def hav(lat1, lon1, lat2, lon2):
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
+    """Haversine distance in meters; lat2/lon2 may be arrays."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dl = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def local_xy(lats, lons, lat0):
+    """Equirectangular projection to meters around lat0 (fine at campus scale)."""
+    x = np.radians(lons) * R * np.cos(np.radians(lat0))
+    y = np.radians(lats) * R
+    return np.column_stack([x, y])
 
 
 def load_nodes():
@@ -63,8 +74,18 @@ def main():
     pois = load_pois()
 
     node_index = {n["id"]: n for n in nodes}
-    # Build simple list for nearest search
-    node_list = [(n["id"], float(n["lat"]), float(n["lon"])) for n in nodes]
+    # Coordinate arrays for nearest search; sized for every POI we may append
+    node_ids = [n["id"] for n in nodes]
+    lats = np.empty(len(nodes) + len(pois))
+    lons = np.empty(len(nodes) + len(pois))
+    lats[: len(nodes)] = [float(n["lat"]) for n in nodes]
+    lons[: len(nodes)] = [float(n["lon"]) for n in nodes]
+    # KD-tree (local meters) over the existing nodes; POIs added below are few
+    # and are checked directly
+    n_base = len(nodes)
+    lat0 = float(lats[:n_base].mean())
+    tree = cKDTree(local_xy(lats[:n_base], lons[:n_base], lat0))
+    n_cand = min(4, n_base)
 
     next_node_id = 1 + max(int(n["id"][1:]) for n in nodes if n["id"].startswith("n"))
     next_edge_id = 1 + max(int(e["id"][1:]) for e in edges if e["id"].startswith("e"))
@@ -72,12 +93,12 @@ def main():
     added = 0
     for poi in pois:
         # find nearest existing nodes (up to 2) within a larger radius
-        nearest = []
-        for nid, lat, lon in node_list:
-            d = hav(poi["lat"], poi["lon"], lat, lon)
-            nearest.append((d, nid, lat, lon))
-        nearest.sort(key=lambda x: x[0])
-        nearest = [n for n in nearest[:2] if n[0] <= 400]  # up to 400m
+        _, cand = tree.query(local_xy(poi["lat"], poi["lon"], lat0)[0], k=n_cand)
+        cand = np.append(np.atleast_1d(cand), np.arange(n_base, len(node_ids)))
+        dists = hav(poi["lat"], poi["lon"], lats[cand], lons[cand])
+        # two closest, closest first (ties keep node order)
+        closest = sorted(zip(dists.tolist(), cand.tolist()))[:2]
+        nearest = [(d, node_ids[i]) for d, i in closest if d <= 400]  # up to 400m
         if not nearest:
             continue
 
@@ -91,10 +112,12 @@ def main():
                 "label": poi["label"],
             }
         )
-        node_list.append((new_id, poi["lat"], poi["lon"]))
+        lats[len(node_ids)] = poi["lat"]
+        lons[len(node_ids)] = poi["lon"]
+        node_ids.append(new_id)
         node_index[new_id] = nodes[-1]
 
-        for d, tgt, _, _ in nearest:
+        for d, tgt in nearest:
             edges.append(
                 {
                     "id": f"e{next_edge_id}",
@@ -109,16 +132,12 @@ def main():
         added += 1
 
     # write back
-    with NODES_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "lat", "lon", "label"])
-        writer.writeheader()
-        writer.writerows(nodes)
-    with EDGES_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, fieldnames=["id", "source", "target", "length_m", "capacity", "kind"]
-        )
-        writer.writeheader()
-        writer.writerows(edges)
+    pd.DataFrame(nodes, columns=["id", "lat", "lon", "label"]).to_csv(
+        NODES_CSV, index=False
+    )
+    pd.DataFrame(
+        edges, columns=["id", "source", "target", "length_m", "capacity", "kind"]
+    ).to_csv(EDGES_CSV, index=False)
 
     print(f"Added {added} POI nodes/connectors. Total nodes={len(nodes)}, edges={len(edges)}")
 
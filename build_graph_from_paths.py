@@ -6,12 +6,15 @@ Outputs:
 - data/edges.csv : path segment edges + POI connectors to nearest path node
 """
 
-import csv
 import json
 import math
 from pathlib import Path
 from collections import OrderedDict
 
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
 PATH_GJ = Path("giki_path.geojson")
 POI_GJ = Path("giki_map.geojson")
 NODES_CSV = Path("data/nodes.csv")
@@ -28,6 +31,22 @@ def hav(lat1, lon1, lat2, lon2):
     return 2 * R * math.asin(math.sqrt(a))
 
 
+def hav_np(lat, lon, lats, lons):
+    """Vectorized hav from one point to arrays of lats/lons (meters)."""
+    phi1, phi2 = np.radians(lat), np.radians(lats)
+    dphi = np.radians(lats - lat)
+    dl = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def local_xy(lats, lons, lat0):
+    """Equirectangular projection to meters around lat0 (fine at campus scale)."""
+    x = np.radians(lons) * R * np.cos(np.radians(lat0))
+    y = np.radians(lats) * R
+    return np.column_stack([x, y])
+
+
 def load_paths():
     gj = json.load(PATH_GJ.open(encoding="utf-8"))
     return [
@@ -113,17 +132,25 @@ def build_graph():
             next_edge_id += 1
 
     # Snap POIs to nearest path node
-    path_nodes_list = [
-        (nid, float(n["lat"]), float(n["lon"])) for nid, n in nodes.items()
-    ]
+    path_ids = list(nodes)
+    path_lats = np.array([float(n["lat"]) for n in nodes.values()])
+    path_lons = np.array([float(n["lon"]) for n in nodes.values()])
     snap_threshold = 200.0  # meters
+    # KD-tree over path nodes in local meters gives a few candidates per POI;
+    # the exact haversine is only evaluated on those
+    lat0 = float(path_lats.mean())
+    tree = cKDTree(local_xy(path_lats, path_lons, lat0))
+    poi_lats = np.array([poi["lat"] for poi in pois], dtype=np.float64)
+    poi_lons = np.array([poi["lon"] for poi in pois], dtype=np.float64)
+    n_cand = min(4, len(path_ids))
+    _, cands = tree.query(local_xy(poi_lats, poi_lons, lat0), k=n_cand)
+    cands = np.asarray(cands).reshape(len(pois), n_cand)
     for idx, poi in enumerate(pois, start=1):
-        nearest = []
-        for nid, lat, lon in path_nodes_list:
-            d = hav(poi["lat"], poi["lon"], lat, lon)
-            nearest.append((d, nid))
-        nearest.sort(key=lambda x: x[0])
-        nearest = [pair for pair in nearest if pair[0] <= snap_threshold][:2]
+        cand = cands[idx - 1]
+        d = hav_np(poi["lat"], poi["lon"], path_lats[cand], path_lons[cand])
+        # two closest, closest first (ties keep node order)
+        closest = sorted(zip(d.tolist(), cand.tolist()))[:2]
+        nearest = [(dist, path_ids[j]) for dist, j in closest if dist <= snap_threshold]
         if not nearest:
             continue
         pid = f"p{idx}"
@@ -142,16 +169,12 @@ def build_graph():
             next_edge_id += 1
 
     # Write CSVs
-    with NODES_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "lat", "lon", "label"])
-        writer.writeheader()
-        writer.writerows(nodes.values())
-    with EDGES_CSV.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, fieldnames=["id", "source", "target", "length_m", "capacity", "kind"]
-        )
-        writer.writeheader()
-        writer.writerows(edges)
+    pd.DataFrame(list(nodes.values()), columns=["id", "lat", "lon", "label"]).to_csv(
+        NODES_CSV, index=False
+    )
+    pd.DataFrame(
+        edges, columns=["id", "source", "target", "length_m", "capacity", "kind"]
+    ).to_csv(EDGES_CSV, index=False)
 
     print(f"Built graph: nodes={len(nodes)}, edges={len(edges)}")
 
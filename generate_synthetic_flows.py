@@ -40,53 +40,51 @@ def load_edges():
 
 
 def generate_base_flow(capacity, hour, is_peak):
+    """Mean flow; works elementwise on scalars or broadcastable arrays."""
     base = 0.25 * capacity
-    if is_peak:
-        base += 0.4 * capacity
-    else:
-        # mild off-peak usage
-        base += 0.1 * capacity
+    # peak vs mild off-peak usage
+    base = base + np.where(is_peak, 0.4 * capacity, 0.1 * capacity)
     # add hour trend (morning < afternoon)
-    base += 0.05 * capacity * (hour / 24)
+    base = base + 0.05 * capacity * (hour / 24)
     return base
 
 
 def build_dataset():
     edges = load_edges()
-    rows = []
     rng = np.random.default_rng(42)
     total_steps = POINTS_PER_DAY * DAYS
 
-    for edge in edges:
-        cap = float(edge["capacity"])
-        length = float(edge["length_m"])
-        edge_id = edge["id"]
-        for t in range(total_steps):
-            day = t // POINTS_PER_DAY
-            day_of_week = day % 7
-            idx_in_day = t % POINTS_PER_DAY
-            hour = (idx_in_day * INTERVAL_MINUTES) / 60
-            is_peak = int(int(hour) in PEAK_HOURS)
-
-            mean_flow = generate_base_flow(cap, hour, is_peak)
-            noise = rng.normal(0, 0.08 * cap)
-            flow = max(0.0, mean_flow + noise)
-
-            rows.append(
-                {
-                    "edge_id": edge_id,
-                    "t": t,
-                    "day": day,
-                    "day_of_week": day_of_week,
-                    "hour": hour,
-                    "is_peak": is_peak,
-                    "capacity": cap,
-                    "length_m": length,
-                    "flow": flow,
-                }
-            )
-
-    df = pd.DataFrame(rows)
+    # Per-timestep columns, shape (T,)
+    t = np.arange(total_steps)
+    day = t // POINTS_PER_DAY
+    day_of_week = day % 7
+    hour = ((t % POINTS_PER_DAY) * INTERVAL_MINUTES) / 60
+    is_peak = np.isin(hour.astype(int), PEAK_HOURS).astype(int)
+
+    # Per-edge columns, shape (E, 1) so they broadcast against time
+    edge_ids = np.array([edge["id"] for edge in edges], dtype=object)
+    caps = np.array([float(edge["capacity"]) for edge in edges])[:, None]
+    lengths = np.array([float(edge["length_m"]) for edge in edges])[:, None]
+
+    mean_flow = generate_base_flow(caps, hour, is_peak)
+    # Drawn edge-major, same sequence as one rng.normal(0, 0.08 * cap) per row
+    noise = rng.normal(0, 1, size=mean_flow.shape) * (0.08 * caps)
+    flow = np.maximum(0.0, mean_flow + noise)
+
+    n_edges = len(edges)
+    df = pd.DataFrame(
+        {
+            "edge_id": np.repeat(edge_ids, total_steps),
+            "t": np.tile(t, n_edges),
+            "day": np.tile(day, n_edges),
+            "day_of_week": np.tile(day_of_week, n_edges),
+            "hour": np.tile(hour, n_edges),
+            "is_peak": np.tile(is_peak, n_edges),
+            "capacity": np.repeat(caps.ravel(), total_steps),
+            "length_m": np.repeat(lengths.ravel(), total_steps),
+            "flow": flow.ravel(),
+        }
+    )
     # Lag features per edge
     df["flow_lag1"] = df.groupby("edge_id")["flow"].shift(1)
     df["flow_lag2"] = df.groupby("edge_id")["flow"].shift(2)
@@ -4,9 +4,84 @@ Minimal sanity checks for backend endpoints using Flask test client.
 Run: python test_api.py
 """
 
+from itertools import islice
+
+import networkx as nx
+
+import app as backend
 from app import app
 
 
+def sample_pairs(n=5):
+    """A few reachable (source, target) pairs from the largest component."""
+    nodes = sorted(max(nx.connected_components(backend.GRAPH), key=len))
+    step = max(1, len(nodes) // (2 * n))
+    return [(nodes[i], nodes[-1 - i]) for i in range(0, len(nodes) // 2, step)][:n]
+
+
+def edge_weight(weights):
+    """networkx weight callable reading a per-edge list aligned with EDGE_IDS."""
+    return lambda u, v, d: weights[backend.EDGE_ID_TO_INDEX[d["id"]]]
+
+
+def path_cost(path, weight):
+    return sum(weight(u, v, backend.GRAPH[u][v]) for u, v in zip(path, path[1:]))
+
+
+def check_astar():
+    """CSR A* must find paths as cheap as networkx.astar_path."""
+    by_len = edge_weight(backend.IGRAPH_LEN)
+    by_pen = edge_weight(app.forecast.pen_weight)
+    for src, tgt in sample_pairs():
+        ref = nx.astar_path(backend.GRAPH, src, tgt, weight="length_m")
+        got = backend.astar_distance_only(src, tgt)
+        assert got[0] == src and got[-1] == tgt, "astar_distance_only endpoints"
+        assert abs(path_cost(got, by_len) - path_cost(ref, by_len)) < 1e-6, (
+            f"astar_distance_only cost mismatch {src}->{tgt}"
+        )
+        ref = nx.astar_path(backend.GRAPH, src, tgt, weight=by_pen)
+        got = backend.astar_with_congestion(src, tgt, app.forecast.pen_weight_csr)
+        assert abs(path_cost(got, by_pen) - path_cost(ref, by_pen)) < 1e-6, (
+            f"astar_with_congestion cost mismatch {src}->{tgt}"
+        )
+
+
+def check_k_shortest(client):
+    """igraph Yen must match networkx.shortest_simple_paths costs."""
+    by_len = edge_weight(backend.IGRAPH_LEN)
+    for src, tgt in sample_pairs(3):
+        ref = islice(
+            nx.shortest_simple_paths(backend.GRAPH, src, tgt, weight="length_m"), 3
+        )
+        got = backend.k_shortest_paths(src, tgt, backend.IGRAPH_LEN, 3)
+        ref_costs = [path_cost(p, by_len) for p in ref]
+        got_costs = [path_cost(p, by_len) for p in got]
+        assert len(got_costs) == len(ref_costs) and all(
+            abs(a - b) < 1e-6 for a, b in zip(got_costs, ref_costs)
+        ), f"k_shortest_paths cost mismatch {src}->{tgt}"
+
+    # k < 1 still yields the single best path, over the API too
+    src, tgt = sample_pairs(1)[0]
+    assert len(backend.k_shortest_paths(src, tgt, backend.IGRAPH_LEN, 0)) == 1
+    r = client.get(f"/route?source={src}&target={tgt}&k=0")
+    assert r.status_code == 200, f"/route k=0 failed: {r.status_code}"
+    assert len(r.get_json()["shortest_alts"]) == 1, "k=0 should give one alternative"
+    r = client.get(f"/route?source={src}&target={tgt}&k=abc")
+    assert r.status_code == 400, f"/route bad k: {r.status_code}"
+
+    # nodes in different components are unreachable
+    comps = sorted(nx.connected_components(backend.GRAPH), key=len)
+    src, tgt = min(comps[0]), min(comps[-1])
+    try:
+        backend.k_shortest_paths(src, tgt, backend.IGRAPH_LEN, 3)
+    except nx.NetworkXNoPath:
+        pass
+    else:
+        raise AssertionError("unreachable pair should raise NetworkXNoPath")
+    r = client.get(f"/route?source={src}&target={tgt}")
+    assert r.status_code == 404, f"/route unreachable pair: {r.status_code}"
+
+
 def run_sanity():
     client = app.test_client()
 
@@ -29,6 +104,9 @@ def run_sanity():
         r = client.get(f"/route?source={src}&target={tgt}")
         assert r.status_code in (200, 404, 400), f"/route unexpected status {r.status_code}"
 
+    check_astar()
+    check_k_shortest(client)
+
     print("Sanity checks passed.")
 
 